@@ -12,16 +12,49 @@ Features:
 """
 
 import os
+import csv
+import shutil
+import tempfile
+import threading
 import zipfile
 import requests
+import numpy as np
 import pandas as pd
-from io import BytesIO
-from typing import List, Dict, Optional
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import List, Dict, Optional, Tuple
+from rich import box
 from rich.console import Console
 from rich.table import Table
 
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.csv as pacsv
+    import pyarrow.parquet as pq
+except ImportError:  # pyarrow is optional; pandas is used instead
+    pa = None
+    pc = None
+    pacsv = None
+    pq = None
+
 console = Console()
 
+# Chunk size used when streaming downloads and archive members to disk
+COPY_BUFFER_SIZE = 1 << 20
+
+# Rows written per batch when saving result CSVs (pandas / PyArrow writers)
+CSV_CHUNKSIZE = 50000
+ARROW_CSV_BATCH_SIZE = 65536
+
+# Lower-cased copy of the search column attached by load_metadata
+SEARCH_COLUMN = "_search_lc"
+
+# In-process cache of loaded tables and their search indexes, keyed by
+# (metadata_type, columns)
+_METADATA_CACHE: Dict[tuple, pd.DataFrame] = {}
+_SEARCH_INDEXES: Dict[tuple, Tuple[np.ndarray, List[np.ndarray]]] = {}
+
 # -----------------------
 # 1️⃣ Metadata URLs
 # -----------------------
@@ -30,29 +63,53 @@ METADATA_SPECS = {
         "filename": "chip_atlas_experiment_list.zip",
         "url": "https://dbarchive.biosciencedbc.jp/data/chip-atlas/LATEST/chip_atlas_experiment_list.zip",
         "unzipped_files": ["chip_atlas_experiment_list.tsv", "chip_atlas_experiment_list.csv"],
+        "search_col": "Antigen",
     },
     "file_list": {
         "filename": "chip_atlas_file_list.zip",
         "url": "https://dbarchive.biosciencedbc.jp/data/chip-atlas/LATEST/chip_atlas_file_list.zip",
         "unzipped_files": ["chip_atlas_file_list.tsv", "chip_atlas_file_list.csv"],
+        "search_col": "Antigen",
     },
     "analysis_list": {
         "filename": "chip_atlas_analysis_list.zip",
         "url": "https://dbarchive.biosciencedbc.jp/data/chip-atlas/LATEST/chip_atlas_analysis_list.zip",
         "unzipped_files": ["chip_atlas_analysis_list.tsv", "chip_atlas_analysis_list.csv"],
+        "search_col": "Antigen",
     },
     "antigen_list": {
         "filename": "chip_atlas_antigen_list.zip",
         "url": "https://dbarchive.biosciencedbc.jp/data/chip-atlas/LATEST/chip_atlas_antigen_list.zip",
         "unzipped_files": ["chip_atlas_antigen_list.tsv", "chip_atlas_antigen_list.csv"],
+        "search_col": "Antigen",
     },
     "celltype_list": {
         "filename": "chip_atlas_celltype_list.zip",
         "url": "https://dbarchive.biosciencedbc.jp/data/chip-atlas/LATEST/chip_atlas_celltype_list.zip",
         "unzipped_files": ["chip_atlas_celltype_list.tsv", "chip_atlas_celltype_list.csv"],
+        "search_col": "Cell type",
     },
 }
 
+_DOWNLOAD_LOCKS = {k: threading.Lock() for k in METADATA_SPECS}
+
+# Local storage for extracted metadata tables and saved results
+_BASE = Path("~/Chip_Atlasmcp").expanduser()
+_RESULTS = _BASE / "results"
+
+
+def _results_dir() -> Path:
+    """Directory for saved results, created if missing.
+
+    ``CHIP_ATLAS_RESULTS_DIR`` overrides the default. Only the save paths
+    call this, so the check costs one ``mkdir`` per save and a directory
+    removed while the server runs is simply recreated.
+    """
+    override = os.environ.get("CHIP_ATLAS_RESULTS_DIR")
+    path = Path(override) if override else _RESULTS
+    path.mkdir(parents=True, exist_ok=True)
+    return path
+
 
 # -----------------------
 # 2️⃣ Ensure file exists or download
@@ -64,96 +121,369 @@ def ensure_metadata_file(metadata_type: str, silent: bool = False) -> Optional[s
             console.print(f"[red]Unknown metadata type: {metadata_type}[/red]")
         return None
 
+    # One download per table at a time, so a query never reads a file that a
+    # concurrent prefetch is still extracting
+    with _DOWNLOAD_LOCKS[metadata_type]:
+        return _download_metadata_file(metadata_type, silent=silent)
+
+
+def _download_metadata_file(metadata_type: str, silent: bool = False) -> Optional[str]:
+    """Return the local metadata file path, downloading and extracting it if needed."""
     spec = METADATA_SPECS[metadata_type]
-    base_dir = os.path.expanduser("~/Chip_Atlasmcp")
-    os.makedirs(base_dir, exist_ok=True)
 
     # Check if file already present
     for fname in spec["unzipped_files"]:
-        fpath = os.path.join(base_dir, fname)
-        if os.path.exists(fpath):
+        fpath = _BASE / fname
+        if fpath.exists():
             if not silent:
                 console.print(f"[green]Found local file for {metadata_type}:[/green] {fpath}")
-            return fpath
+            return str(fpath)
 
     # Download otherwise
     if not silent:
         console.print(f"[yellow]Downloading {metadata_type} from {spec['url']}...[/yellow]")
+    tmp_path = None
     try:
-        r = requests.get(spec["url"], timeout=60)
-        r.raise_for_status()
-        with zipfile.ZipFile(BytesIO(r.content)) as zf:
-            zf.extractall(base_dir)
+        _BASE.mkdir(parents=True, exist_ok=True)
+        # Stream the archive to disk so it is never held in memory. The name is
+        # fixed per table (downloads hold its lock), so a leftover from an
+        # interrupted run is simply overwritten by the next one.
+        tmp_path = _BASE / (spec["filename"] + ".part")
+        with requests.get(spec["url"], stream=True, timeout=60) as r:
+            r.raise_for_status()
+            r.raw.decode_content = True
+            with open(tmp_path, "wb") as tmp:
+                shutil.copyfileobj(r.raw, tmp, length=COPY_BUFFER_SIZE)
+        # Only the metadata table is needed; stream that one member to disk
+        with zipfile.ZipFile(tmp_path) as zf:
+            member = next((n for n in zf.namelist() if os.path.basename(n) in spec["unzipped_files"]), None)
+            if member:
+                target = _BASE / os.path.basename(member)
+                partial = target.with_name(target.name + ".part")
+                with zf.open(member) as src, open(partial, "wb") as dst:
+                    shutil.copyfileobj(src, dst, length=COPY_BUFFER_SIZE)
+                os.replace(partial, target)
         if not silent:
-            console.print(f"[green]Extracted {metadata_type} into:[/green] {base_dir}")
+            console.print(f"[green]Extracted {metadata_type} into:[/green] {_BASE}")
     except Exception as e:
         if not silent:
             console.print(f"[red]Error downloading/extracting {metadata_type}:[/red] {e}")
         return None
+    finally:
+        if tmp_path and os.path.exists(tmp_path):
+            os.remove(tmp_path)
 
     # Verify extracted file exists
     for fname in spec["unzipped_files"]:
-        fpath = os.path.join(base_dir, fname)
-        if os.path.exists(fpath):
-            return fpath
+        fpath = _BASE / fname
+        if fpath.exists():
+            return str(fpath)
 
     if not silent:
         console.print(f"[red]Error: could not locate {metadata_type} file after extraction.[/red]")
     return None
 
 
+def prefetch_all(silent: bool = True) -> Dict[str, Optional[str]]:
+    """Download and extract every metadata table concurrently.
+
+    Returns a mapping of metadata type to local file path (None on failure).
+    """
+    with ThreadPoolExecutor(max_workers=len(METADATA_SPECS)) as pool:
+        futures = {k: pool.submit(ensure_metadata_file, k, silent) for k in METADATA_SPECS}
+    return {k: f.result() for k, f in futures.items()}
+
+
 # -----------------------
 # 3️⃣ Load metadata safely
 # -----------------------
-def load_metadata(metadata_type: str, silent: bool = False) -> Optional[pd.DataFrame]:
-    """Load a metadata table into a pandas DataFrame."""
+def _read_header(fpath: str) -> Tuple[str, List[str]]:
+    """Return the delimiter (tab or comma) and the column names from the header line."""
+    with open(fpath, "rb") as fh:
+        line = fh.readline().decode("utf-8", errors="replace").rstrip("\r\n")
+    sep = "\t" if "\t" in line else ","
+    quoting = csv.QUOTE_NONE if sep == "\t" else csv.QUOTE_MINIMAL
+    return sep, next(csv.reader([line], delimiter=sep, quoting=quoting), [])
+
+
+def _read_table(fpath: str, sep: str, names: List[str], encoding_errors: str = "strict") -> pd.DataFrame:
+    """Read a delimited metadata file with every column typed as string.
+
+    All ChIP-Atlas metadata fields are text, so declaring the column types
+    up front lets PyArrow skip type inference. Falls back to the C engine
+    without pyarrow, or when Arrow rejects the file; Arrow only accepts
+    valid UTF-8, so that single re-read replaces undecodable bytes.
+    """
+    # Tab-separated ChIP-Atlas files carry no quoting, so skip quote handling
+    if pacsv is not None and encoding_errors == "strict":
+        try:
+            table = pacsv.read_csv(
+                fpath,
+                parse_options=pacsv.ParseOptions(delimiter=sep, quote_char=False if sep == "\t" else '"'),
+                convert_options=pacsv.ConvertOptions(
+                    column_types={name: pa.string() for name in names},
+                    strings_can_be_null=True,
+                ),
+            )
+            return table.to_pandas(types_mapper=pd.ArrowDtype)
+        except pa.ArrowInvalid:
+            encoding_errors = "replace"
+
+    quoting = csv.QUOTE_NONE if sep == "\t" else csv.QUOTE_MINIMAL
+    return pd.read_csv(
+        fpath,
+        sep=sep,
+        engine="c",
+        quoting=quoting,
+        dtype=str,
+        low_memory=False,
+        encoding="utf-8",
+        encoding_errors=encoding_errors,
+    )
+
+
+def _parquet_cache_path(fpath: str) -> str:
+    """Return the Parquet cache path stored next to an extracted metadata file."""
+    return os.path.splitext(fpath)[0] + ".parquet"
+
+
+def _write_parquet_cache(df: pd.DataFrame, parquet_path: str) -> None:
+    """Persist a parsed metadata table as Snappy-compressed Parquet (best effort).
+
+    The table is written to a uniquely named ``.part`` file and moved into
+    place, so readers and concurrent writers never see a partial cache.
+    """
+    partial = None
+    try:
+        fd, partial = tempfile.mkstemp(
+            prefix=os.path.basename(parquet_path) + ".", suffix=".part", dir=os.path.dirname(parquet_path)
+        )
+        os.close(fd)
+        df.to_parquet(partial, compression="snappy", index=False)
+        os.replace(partial, parquet_path)
+    except Exception:
+        # Caching is an optimisation only; a missing Parquet engine or a
+        # read-only directory must not break loading.
+        if partial and os.path.exists(partial):
+            os.remove(partial)
+
+
+def _detect_search_column(df: pd.DataFrame, preferred: Optional[str] = None) -> Optional[str]:
+    """Pick the column that keywords are matched against.
+
+    ``preferred`` (a table's ``search_col``) wins when present; otherwise
+    an antigen column is used, else cell type. Uses the lower-cased column
+    map stashed in ``df.attrs["cols_lc"]`` by ``load_metadata`` when present.
+    """
+    cols_lc = df.attrs.get("cols_lc") or {c.strip().lower(): c for c in df.columns}
+    col = cols_lc.get(preferred.lower()) if preferred else None
+    if not col:
+        col = cols_lc.get("antigen")
+    if not col:
+        possible_cols = [orig for lc, orig in cols_lc.items() if "antigen" in lc]
+        if possible_cols:
+            col = sorted(possible_cols, key=len)[0]
+
+    if not col and "Cell type" in df.columns:
+        col = "Cell type"
+    return col
+
+
+def _add_search_column(df: pd.DataFrame, col: str) -> pd.DataFrame:
+    """Attach a lower-cased copy of ``col`` so queries never re-fold case."""
+    dtype = "string[pyarrow]" if pa is not None else "string"
+    df[SEARCH_COLUMN] = df[col].astype(dtype).str.lower()
+    return df
+
+
+def _read_metadata(
+    metadata_type: str, silent: bool = False, columns: Optional[List[str]] = None
+) -> Optional[pd.DataFrame]:
+    """Read a metadata table from disk (Parquet cache first, then TSV/CSV)."""
     fpath = ensure_metadata_file(metadata_type, silent=silent)
     if not fpath:
         return None
 
+    parquet_path = _parquet_cache_path(fpath)
+    df = None
     try:
-        sep = "\t" if fpath.endswith(".tsv") else None
-        df = pd.read_csv(fpath, sep=sep, dtype=str, encoding="utf-8", engine="python")
-        if df.shape[1] == 1:
-            df = pd.read_csv(fpath, sep=",", dtype=str, encoding="utf-8", engine="python")
-    except UnicodeDecodeError:
-        df = pd.read_csv(fpath, sep=sep, dtype=str, encoding="latin1", engine="python")
-        if df.shape[1] == 1:
-            df = pd.read_csv(fpath, sep=",", dtype=str, encoding="latin1", engine="python")
+        if pq is not None and os.path.exists(parquet_path) and os.path.getmtime(parquet_path) >= os.path.getmtime(fpath):
+            try:
+                cached_columns = pq.read_schema(parquet_path).names
+            except Exception:
+                cached_columns = None  # corrupt or truncated; rebuilt below and replaced atomically
+            if cached_columns is not None:
+                missing = [c for c in columns or () if c not in cached_columns]
+                if missing:
+                    raise KeyError(f"columns not in {metadata_type}: {missing}")
+                try:
+                    df = pd.read_parquet(parquet_path, engine="pyarrow", columns=columns, dtype_backend="pyarrow")
+                except Exception:
+                    df = None
+        if df is None:
+            sep, names = _read_header(fpath)
+            try:
+                df = _read_table(fpath, sep, names)
+            except UnicodeDecodeError:
+                df = _read_table(fpath, sep, names, encoding_errors="replace")
+            df.columns = [c.strip() for c in df.columns]
+            _write_parquet_cache(df, parquet_path)
+            if columns is not None:
+                df = df[columns]
     except Exception as e:
         if not silent:
             console.print(f"[red]Error loading {metadata_type} file:[/red] {e}")
         return None
 
-    df.columns = [c.strip() for c in df.columns]
-    if not silent:
+    if not silent and os.environ.get("CHIPATLAS_DEBUG", "0") == "1":
         console.print(f"[cyan]Loaded columns:[/cyan] {list(df.columns)}")
+
+    df.attrs["cols_lc"] = {c.strip().lower(): c for c in df.columns}
+    col = _detect_search_column(df, METADATA_SPECS.get(metadata_type, {}).get("search_col"))
+    if col:
+        _add_search_column(df, col)
     return df
 
 
+def load_metadata(
+    metadata_type: str, silent: bool = False, columns: Optional[List[str]] = None
+) -> Optional[pd.DataFrame]:
+    """Load a metadata table into a pandas DataFrame.
+
+    The first load parses the extracted TSV/CSV and caches it as Parquet;
+    later loads read the cache, restricted to ``columns`` when given. When a
+    search column is present, a lower-cased copy is attached as
+    ``SEARCH_COLUMN`` for use by ``fetch_and_display``.
+
+    Loaded tables are also kept in memory for the lifetime of the process
+    (set ``CHIPATLAS_CACHE=0`` to disable); callers receive a shallow copy.
+    """
+    if not _cache_enabled():
+        return _read_metadata(metadata_type, silent=silent, columns=columns)
+
+    key = _cache_key(metadata_type, columns)
+    df = _METADATA_CACHE.get(key)
+    if df is None:
+        df = _read_metadata(metadata_type, silent=silent, columns=columns)
+        if df is None:
+            return None
+        _METADATA_CACHE[key] = df
+        if SEARCH_COLUMN in df.columns:
+            _SEARCH_INDEXES[key] = _build_search_index(df[SEARCH_COLUMN])
+    return df.copy(deep=False)
+
+
+def _cache_enabled() -> bool:
+    """Whether loaded tables are kept in memory (``CHIPATLAS_CACHE=0`` disables it)."""
+    return os.environ.get("CHIPATLAS_CACHE", "1") != "0"
+
+
+def _cache_key(metadata_type: str, columns: Optional[List[str]]) -> tuple:
+    """Key used for the in-memory table and search-index caches."""
+    return (metadata_type, tuple(columns) if columns is not None else None)
+
+
+def _build_search_index(values: pd.Series) -> Tuple[np.ndarray, List[np.ndarray]]:
+    """Index the distinct lower-cased values and the row positions holding each.
+
+    Returns a fixed-width string array of the distinct values and, aligned
+    with it, one array of row positions per value.
+    """
+    codes, uniques = pd.factorize(values)
+    order = np.argsort(codes, kind="stable")
+    n_missing = int((codes < 0).sum())
+    counts = np.bincount(codes[codes >= 0], minlength=len(uniques))
+    groups = np.split(order[n_missing:], np.cumsum(counts)[:-1])
+    return np.asarray(uniques, dtype=str), groups
+
+
+def clear_metadata_cache() -> None:
+    """Drop every table held by the in-memory ``load_metadata`` cache."""
+    _METADATA_CACHE.clear()
+    _SEARCH_INDEXES.clear()
+
+
 # -----------------------
 # 4️⃣ Fetch, filter, display, save
 # -----------------------
-def fetch_and_display(metadata_type: str, keyword: str, column_hint: str = "Antigen", silent: bool = False):
-    """Fetch and display entries from the chosen metadata list filtered by keyword."""
-    df = load_metadata(metadata_type, silent=silent)
+def _write_csv(df: pd.DataFrame, fpath: str) -> None:
+    """Write ``df`` as CSV (gzip-compressed if ``fpath`` ends in .gz).
+
+    Uses PyArrow's C++ CSV writer when available, pandas otherwise.
+    """
+    if pa is not None:
+        try:
+            table = pa.Table.from_pandas(df, preserve_index=False)
+        except (ValueError, TypeError):
+            # Includes ArrowInvalid/ArrowTypeError and duplicate column names
+            table = None
+        if table is not None:
+            options = pacsv.WriteOptions(batch_size=ARROW_CSV_BATCH_SIZE)
+            if fpath.endswith(".gz"):
+                with pa.CompressedOutputStream(fpath, "gzip") as out:
+                    pacsv.write_csv(table, out, write_options=options)
+            else:
+                pacsv.write_csv(table, fpath, write_options=options)
+            return
+    # Result cells (titles, cell type descriptions) may contain commas, so
+    # quoting stays minimal rather than QUOTE_NONE
+    df.to_csv(
+        fpath,
+        index=False,
+        encoding="utf-8",
+        chunksize=CSV_CHUNKSIZE,
+        lineterminator="\n",
+        quoting=csv.QUOTE_MINIMAL,
+    )
+
+
+def _keyword_mask(values: pd.Series, keyword: str) -> np.ndarray:
+    """Return a boolean mask of rows whose lower-cased value contains ``keyword``.
+
+    ``values`` must already be lower-cased (see ``SEARCH_COLUMN``) and
+    ``keyword`` is matched literally, never as a regular expression.
+    Arrow-backed strings use Arrow's substring kernel; anything else is
+    scanned with a plain ``in`` over the raw values, which beats
+    ``str.contains`` on object arrays.
+    """
+    if pa is not None and isinstance(values.array, pd.arrays.ArrowExtensionArray):
+        arr = pa.array(values.array)
+        if pa.types.is_string(arr.type) or pa.types.is_large_string(arr.type):
+            return pc.match_substring(arr, keyword).fill_null(False).to_numpy(zero_copy_only=False)
+    raw = values.to_numpy(dtype=object)
+    return np.fromiter((isinstance(v, str) and keyword in v for v in raw), dtype=bool, count=len(raw))
+
+
+def _index_lookup(index: Tuple[np.ndarray, List[np.ndarray]], keyword: str) -> np.ndarray:
+    """Return the sorted row positions whose indexed value contains ``keyword``."""
+    values, groups = index
+    hits = np.flatnonzero(np.char.find(values, keyword) >= 0)
+    if not len(hits):
+        return np.empty(0, dtype=np.intp)
+    return np.sort(np.concatenate([groups[i] for i in hits]))
+
+
+def fetch_and_display(
+    metadata_type: str,
+    keyword: str,
+    column_hint: str = "Antigen",
+    silent: bool = False,
+    columns: Optional[List[str]] = None,
+    save: bool = True,
+):
+    """Fetch and display entries from the chosen metadata list filtered by keyword.
+
+    Pass ``columns`` to load only a subset of the table (it must include the
+    search column); by default every column is loaded and saved. With
+    ``save=False`` the matches are only returned, leaving the write to
+    ``save_full_dataset``.
+    """
+    df = load_metadata(metadata_type, silent=silent, columns=columns)
     if df is None:
         return None
 
     # --- Smart column detection ---
-    col = None
-    for c in df.columns:
-        if c.strip().lower() == "antigen":
-            col = c
-            break
-    if not col:
-        possible_cols = [c for c in df.columns if "antigen" in c.lower()]
-        if possible_cols:
-            col = sorted(possible_cols, key=len)[0]
-
-    if not col and "Cell type" in df.columns:
-        col = "Cell type"
-
+    col = _detect_search_column(df, METADATA_SPECS.get(metadata_type, {}).get("search_col"))
     if not col:
         if not silent:
             console.print(f"[red]No suitable column found in {metadata_type}[/red]")
@@ -163,7 +493,16 @@ def fetch_and_display(metadata_type: str, keyword: str, column_hint: str = "Anti
         console.print(f"[green]Using column:[/green] {col}")
 
     # --- Search keyword (case-insensitive) ---
-    matches = df[df[col].astype(str).str.contains(keyword, case=False, na=False)]
+    keyword_lc = keyword.lower()
+    # An index is only valid for the cached table it was built from
+    index = _SEARCH_INDEXES.get(_cache_key(metadata_type, columns)) if _cache_enabled() else None
+    if index is not None and SEARCH_COLUMN in df.columns:
+        matches = df.iloc[_index_lookup(index, keyword_lc)]
+    else:
+        if SEARCH_COLUMN not in df.columns:
+            df = _add_search_column(df.copy(deep=False), col)
+        matches = df[_keyword_mask(df[SEARCH_COLUMN], keyword_lc)]
+    matches = matches.drop(columns=SEARCH_COLUMN)
     if matches.empty:
         if not silent:
             console.print(f"[yellow]No entries found for '{keyword}' in {metadata_type}[/yellow]")
@@ -174,21 +513,20 @@ def fetch_and_display(metadata_type: str, keyword: str, column_hint: str = "Anti
 
         # Display preview table
         preview_cols = matches.columns[:5].tolist()
-        table = Table(show_header=True, header_style="bold magenta")
+        table = Table(show_header=True, header_style="bold magenta", box=box.SIMPLE, pad_edge=False)
         for c in preview_cols:
-            table.add_column(c, overflow="fold", justify="center")
-        for _, row in matches.head(10).iterrows():
-            table.add_row(*[str(row.get(c, "N/A")) for c in preview_cols])
+            table.add_column(c, overflow="crop", justify="center")
+        rows = matches[preview_cols].head(10).astype(object).fillna("N/A").astype(str).to_numpy()
+        for row in rows:
+            table.add_row(*row)
         console.print(table)
 
     # --- Save full dataset ---
-    results_dir = os.path.expanduser("~/Chip_Atlasmcp/results")
-    os.makedirs(results_dir, exist_ok=True)
-    fname = f"chip_atlas_{keyword}_{metadata_type}.csv"
-    fpath = os.path.join(results_dir, fname)
-    matches.to_csv(fpath, index=False)
-    if not silent:
-        console.print(f"[green]Full dataset saved to:[/green] {fpath}\n")
+    if save:
+        fpath = str(_results_dir() / f"chip_atlas_{keyword}_{metadata_type}.csv")
+        _write_csv(matches, fpath)
+        if not silent:
+            console.print(f"[green]Full dataset saved to:[/green] {fpath}\n")
 
     return matches
 
@@ -196,19 +534,20 @@ def fetch_and_display(metadata_type: str, keyword: str, column_hint: str = "Anti
 # -----------------------
 # 5️⃣ Save helper
 # -----------------------
-def save_full_dataset(df, gene: str, metadata_type: str, silent: bool = False):
-    """Save the complete filtered dataset (all rows and columns) as CSV."""
+def save_full_dataset(df, gene: str, metadata_type: str, silent: bool = False, compress: bool = False):
+    """Save the complete filtered dataset (all rows and columns) as CSV.
+
+    With ``compress=True`` the file is written gzip-compressed as ``.csv.gz``.
+    """
     try:
         if df is None or (hasattr(df, "empty") and df.empty):
             if not silent:
                 console.print(f"[yellow]No data to save for {gene} ({metadata_type})[/yellow]")
             return
 
-        results_dir = os.path.expanduser("~/Chip_Atlasmcp/results")
-        os.makedirs(results_dir, exist_ok=True)
-        filename = f"chip_atlas_{gene}_{metadata_type}.csv"
-        filepath = os.path.join(results_dir, filename)
-        df.to_csv(filepath, index=False, encoding="utf-8")
+        filename = f"chip_atlas_{gene}_{metadata_type}.csv" + (".gz" if compress else "")
+        filepath = str(_results_dir() / filename)
+        _write_csv(df, filepath)
         if not silent:
             console.print(f"[green]Full dataset saved successfully:[/green] {filepath}")
     except Exception as e:
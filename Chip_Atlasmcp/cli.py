@@ -31,7 +31,7 @@ def fetch(
 
     try:
         # Fetch and display the data (main output comes from Chip_Atlasmcp.py)
-        data = Chip_Atlasmcp.fetch_and_display(metadata_type, gene)
+        data = Chip_Atlasmcp.fetch_and_display(metadata_type, gene, save=False)
 
         if data is None or (hasattr(data, "empty") and data.empty):
             console.print(f"[yellow]No data found for gene: {gene} in {metadata_type}[/yellow]")
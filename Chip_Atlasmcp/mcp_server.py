@@ -2,20 +2,26 @@
 import sys
 import os
 import asyncio
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
 
 sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
 
-# === Silence console + print output when running as MCP ===
-import builtins
+# === Silence console output when running as MCP ===
+class _NullConsole:
+    """Console stand-in whose print returns immediately, skipping Rich formatting."""
+
+    def print(self, *args, **kwargs):
+        pass
+
 
 if os.environ.get("MCP_SILENT", "1") == "1":
-    # Disable normal print()
-    builtins.print = lambda *a, **k: None
     try:
-        from rich.console import Console
-        import Chip_Atlasmcp
-        silent_console = Console(file=open(os.devnull, "w"))
-        Chip_Atlasmcp.console = silent_console
+        from Chip_Atlasmcp import Chip_Atlasmcp as _chip_atlas
+        from Chip_Atlasmcp import utils as _utils
+        _chip_atlas.console = _NullConsole()
+        _utils.console = _NullConsole()
     except Exception:
         pass
 
@@ -35,25 +41,19 @@ from Chip_Atlasmcp import utils
 # === Initialize MCP ===
 mcp = FastMCP("Chip_Atlas MCP")
 
+# Dedicated worker pool so fetches for different tables run in parallel
+_POOL = ThreadPoolExecutor(max_workers=min(8, os.cpu_count() or 1))
+
 # -----------------------------
 # 🔬 Fetch Chip Atlas Metadata
 # -----------------------------
-@mcp.tool()
-async def fetch_chip_atlas(
-    gene: str,
-    metadata_type: str = "experiment_list"
-):
-    """
-    Fetch ChIP-Atlas metadata and return structured JSON.
-
-    Args:
-        gene: Gene or antigen keyword (e.g. "TP53", "H3K4me3")
-        metadata_type: experiment_list | file_list | analysis_list | antigen_list | celltype_list
-    """
+async def _fetch_metadata(gene: str, metadata_type: str):
+    """Run one fetch + save on the worker pool and build the tool response."""
     try:
         loop = asyncio.get_event_loop()
         # Run with silent=True to suppress console output
-        df = await loop.run_in_executor(None, Chip_Atlasmcp.fetch_and_display, metadata_type, gene, "Antigen", True)
+        fetch = functools.partial(Chip_Atlasmcp.fetch_and_display, metadata_type, gene, "Antigen", True, save=False)
+        df = await loop.run_in_executor(_POOL, fetch)
 
         if df is None or getattr(df, "empty", True):
             return {
@@ -64,7 +64,7 @@ async def fetch_chip_atlas(
             }
 
         # Save dataset silently
-        await loop.run_in_executor(None, Chip_Atlasmcp.save_full_dataset, df, gene, metadata_type, True)
+        await loop.run_in_executor(_POOL, Chip_Atlasmcp.save_full_dataset, df, gene, metadata_type, True)
 
         # Prepare preview for Claude
         preview = df.head(10).to_dict(orient="records")
@@ -81,6 +81,39 @@ async def fetch_chip_atlas(
     except Exception as e:
         return {"status": "error", "message": str(e)}
 
+
+@mcp.tool()
+async def fetch_chip_atlas(
+    gene: str,
+    metadata_type: str = "experiment_list"
+):
+    """
+    Fetch ChIP-Atlas metadata and return structured JSON.
+
+    Args:
+        gene: Gene or antigen keyword (e.g. "TP53", "H3K4me3")
+        metadata_type: experiment_list | file_list | analysis_list | antigen_list | celltype_list
+    """
+    return await _fetch_metadata(gene, metadata_type)
+
+
+@mcp.tool()
+async def fetch_chip_atlas_multi(
+    gene: str,
+    metadata_types: list[str]
+):
+    """
+    Fetch several ChIP-Atlas metadata tables for one gene in parallel.
+
+    Args:
+        gene: Gene or antigen keyword (e.g. "TP53", "H3K4me3")
+        metadata_types: Any of experiment_list, file_list, analysis_list, antigen_list, celltype_list
+    """
+    # Repeated types would fetch and write the same result file concurrently
+    metadata_types = list(dict.fromkeys(metadata_types))
+    results = await asyncio.gather(*(_fetch_metadata(gene, t) for t in metadata_types))
+    return {"gene": gene, "results": dict(zip(metadata_types, results))}
+
 #  Version Info
 
 @mcp.tool()
@@ -105,5 +138,8 @@ async def ping(msg: str = "hello"):
 
 if __name__ == "__main__":
     if "--serve" in sys.argv:
+        # Warm the metadata files in the background so the first query is fast
+        if os.environ.get("CHIPATLAS_PREFETCH", "1") == "1":
+            threading.Thread(target=Chip_Atlasmcp.prefetch_all, daemon=True).start()
         asyncio.run(mcp.run())
 
@@ -62,11 +62,9 @@ def display_response_table(data, max_rows: int = 10):
             table.add_column(str(header), style="cyan", no_wrap=True)
 
         # Add rows
-        for i, row in enumerate(data):
-            if i >= max_rows:
-                break
-            values = [str(row.get(h, ""))[:77] + "..." if len(str(row.get(h, ""))) > 80 else str(row.get(h, "")) for h in headers]
-            table.add_row(*values)
+        rows = [[str(r.get(h, "")) for h in headers] for r in data[:max_rows]]
+        for row in rows:
+            table.add_row(*[v[:77] + "..." if len(v) > 80 else v for v in row])
 
         console.print(table)
         return
@@ -5,83 +5,320 @@ Run with:
     pytest -v
 """
 
+import asyncio
+import functools
+import io
 import os
+import shutil
+import sys
+import zipfile
 import pandas as pd
 import pytest
 from Chip_Atlasmcp import Chip_Atlasmcp
 
+_REAL_LOAD_METADATA = Chip_Atlasmcp.load_metadata
+_REAL_ENSURE_METADATA_FILE = Chip_Atlasmcp.ensure_metadata_file
 
-@pytest.fixture(scope="module")
+# Interned cell values for the mock experiment_list table
+_EXPERIMENT_IDS = tuple(map(sys.intern, ("EXP001", "EXP002")))
+_ANTIGENS = tuple(map(sys.intern, ("TP53", "TP53BP1")))
+_CELL_TYPES = tuple(map(sys.intern, ("Blood", "Bone")))
+_ASSEMBLIES = tuple(map(sys.intern, ("hg19", "hg38")))
+_TITLES = tuple(map(sys.intern, ("TP53 ChIP-seq", "TP53BP1 ChIP-seq")))
+
+
+@functools.lru_cache(maxsize=None)
+def _mock_experiment_table():
+    """Build the shared mock experiment_list table (once per session)."""
+    return pd.DataFrame({
+        "Experimental ID": pd.array(_EXPERIMENT_IDS, dtype="string"),
+        "Antigen": pd.array(_ANTIGENS, dtype="string"),
+        "Cell type": pd.array(_CELL_TYPES, dtype="string"),
+        "Genome assembly": pd.array(_ASSEMBLIES, dtype="string"),
+        "Title": pd.array(_TITLES, dtype="string")
+    })
+
+
+def _fake_load_metadata(metadata_type, **kwargs):
+    """Serve the mock table for known types; unknown types go through the real loader."""
+    if metadata_type in Chip_Atlasmcp.METADATA_SPECS:
+        return _mock_experiment_table()
+    return _REAL_LOAD_METADATA(metadata_type, **kwargs)
+
+
+def _fake_ensure_metadata_file(metadata_type, **kwargs):
+    """Never download in tests; unknown types still hit the real validation."""
+    if metadata_type in Chip_Atlasmcp.METADATA_SPECS:
+        return None
+    return _REAL_ENSURE_METADATA_FILE(metadata_type, **kwargs)
+
+
+def _no_metadata(metadata_type, **kwargs):
+    """Stand-in reader that finds nothing."""
+    return None
+
+
+class _FakeZipResponse:
+    """Streamed ``requests`` response serving an in-memory metadata archive."""
+
+    def __init__(self, members):
+        buf = io.BytesIO()
+        with zipfile.ZipFile(buf, "w") as zf:
+            for name, data in members.items():
+                zf.writestr(name, data)
+        buf.seek(0)
+        self.raw = buf
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def raise_for_status(self):
+        pass
+
+
+@pytest.fixture(scope="module", autouse=True)
+def _patch_metadata():
+    """Install the metadata stand-ins once for this module.
+
+    Module scope keeps the stand-ins from leaking into other test modules.
+    Tests that exercise the real loader call ``_REAL_LOAD_METADATA`` or
+    patch it back in.
+    """
+    with pytest.MonkeyPatch.context() as mp:
+        mp.setattr(Chip_Atlasmcp, "ensure_metadata_file", _fake_ensure_metadata_file)
+        mp.setattr(Chip_Atlasmcp, "load_metadata", _fake_load_metadata)
+        yield
+
+
+@pytest.fixture(scope="session")
 def setup_tmp_results(tmp_path_factory):
     """Fixture to create a temporary directory for saving test results."""
-    tmp_dir = tmp_path_factory.mktemp("results")
+    tmp_dir = tmp_path_factory.mktemp("chip_atlas_results", numbered=False)
     os.environ["CHIP_ATLAS_RESULTS_DIR"] = str(tmp_dir)
     return tmp_dir
 
 
-def test_fetch_and_display_experiment_list(monkeypatch):
-    """Test that fetch_and_display returns a DataFrame with expected structure for a known gene."""
-    # Patch ensure_metadata_file to skip actual download
-    monkeypatch.setattr(
-        Chip_Atlasmcp,
-        "ensure_metadata_file",
-        lambda x, **kwargs: "tests/mock_experiment_list.csv"
-    )
+@pytest.fixture(scope="session")
+def mock_experiment_df():
+    """Small experiment_list table built once and shared by every test.
+
+    Columns are converted to pandas' string dtype up front. Tests must not
+    mutate it; take ``.copy(deep=False)`` first if needed.
+    """
+    return _mock_experiment_table()
+
+
+@pytest.fixture
+def metadata_tsv(tmp_path, monkeypatch):
+    """A small experiment_list TSV in ``tmp_path`` served by ``ensure_metadata_file``.
 
-    # Create a mock CSV file for testing
-    data = {
-        "Experimental ID": ["EXP001", "EXP002"],
-        "Antigen": ["TP53", "TP53BP1"],
-        "Cell type": ["Blood", "Bone"],
-        "Genome assembly": ["hg19", "hg38"],
-        "Title": ["TP53 ChIP-seq", "TP53BP1 ChIP-seq"]
-    }
-    df_mock = pd.DataFrame(data)
-    df_mock.to_csv("tests/mock_experiment_list.csv", index=False)
+    The in-memory cache is disabled so every load reads from disk; tests may
+    overwrite the file before loading.
+    """
+    tsv_path = tmp_path / "chip_atlas_experiment_list.tsv"
+    tsv_path.write_text("Antigen\tCell type\nTP53\tBlood\nBRCA1\tBreast\n", encoding="utf-8")
 
-    # Run the function
-    df = Chip_Atlasmcp.fetch_and_display("experiment_list", "TP53")
+    def ensure_tsv(metadata_type, **kwargs):
+        return str(tsv_path)
 
-    # Assertions
-    assert isinstance(df, pd.DataFrame)
-    assert "Antigen" in df.columns
-    assert not df.empty
-    assert any(df["Antigen"].str.contains("TP53", case=False))
+    monkeypatch.setenv("CHIPATLAS_CACHE", "0")
+    monkeypatch.setattr(Chip_Atlasmcp, "ensure_metadata_file", ensure_tsv)
+    return tsv_path
 
 
-def test_save_full_dataset_creates_file(setup_tmp_results):
+@pytest.mark.parametrize("mtype,kw,expect_empty", [
+    ("experiment_list", "TP53", False),
+    ("analysis_list", "XYZGENE", True),
+    ("invalid_type", "TP53", True),
+])
+def test_fetch_and_display(setup_tmp_results, mtype, kw, expect_empty):
+    """fetch_and_display returns matches for a known gene and nothing for misses or unknown types."""
+    df = Chip_Atlasmcp.fetch_and_display(mtype, kw)
+
+    if expect_empty:
+        assert df is None or len(df.index) == 0, f"Expected no results for {kw} in {mtype}"
+    else:
+        assert isinstance(df, pd.DataFrame)
+        assert "Antigen" in df.columns
+        assert len(df.index) > 0
+        assert df["Antigen"].isin({"TP53"}).any()
+
+
+def test_save_full_dataset_creates_file(setup_tmp_results, mock_experiment_df):
     """Test that save_full_dataset actually creates a CSV file."""
-    df = pd.DataFrame({
-        "Antigen": ["TP53", "TP53BP1"],
-        "Genome assembly": ["hg19", "hg38"]
-    })
-    Chip_Atlasmcp.save_full_dataset(df, "TP53", "experiment_list")
+    Chip_Atlasmcp.save_full_dataset(mock_experiment_df, "TP53", "experiment_list")
+
+    expected_file = setup_tmp_results / "chip_atlas_TP53_experiment_list.csv"
+    assert expected_file.exists(), f"Expected file {expected_file} not found"
+
+
+def test_save_recreates_removed_results_dir(monkeypatch, tmp_path, mock_experiment_df):
+    """Saving still works after the results directory is removed mid-process."""
+    results_dir = tmp_path / "results"
+    monkeypatch.setenv("CHIP_ATLAS_RESULTS_DIR", str(results_dir))
+    Chip_Atlasmcp.save_full_dataset(mock_experiment_df, "TP53", "experiment_list")
+    shutil.rmtree(results_dir)
 
-    results_dir = os.path.expanduser("~/Chip_Atlasmcp/results")
-    assert os.path.exists(results_dir), "Results directory not created"
+    Chip_Atlasmcp.fetch_and_display("experiment_list", "TP53", silent=True)
+    assert (results_dir / "chip_atlas_TP53_experiment_list.csv").exists()
 
-    expected_file = os.path.join(results_dir, "chip_atlas_TP53_experiment_list.csv")
-    assert os.path.exists(expected_file), f"Expected file {expected_file} not found"
+def test_save_full_dataset_compressed_round_trip(setup_tmp_results, mock_experiment_df):
+    """compress=True writes a gzip CSV that reads back to the same table."""
+    Chip_Atlasmcp.save_full_dataset(mock_experiment_df, "TP53", "experiment_list", compress=True)
 
+    saved = pd.read_csv(setup_tmp_results / "chip_atlas_TP53_experiment_list.csv.gz", compression="gzip", dtype=str)
+    assert saved.to_dict("list") == mock_experiment_df.astype(object).to_dict("list")
 
-def test_fetch_and_display_no_data(monkeypatch):
-    """Test fetch_and_display when no matching keyword is found."""
-    # Patch load_metadata to return dummy dataframe
-    dummy_df = pd.DataFrame({
-        "Antigen": ["BRCA1", "BRCA2"],
-        "Cell type": ["Breast", "Ovary"]
+
+def test_write_csv_falls_back_for_duplicate_columns(tmp_path, mock_experiment_df):
+    """Tables Arrow cannot convert (duplicate column names) are written by pandas."""
+    df = mock_experiment_df[["Antigen", "Antigen"]]
+    out = tmp_path / "duplicate_columns.csv"
+    Chip_Atlasmcp._write_csv(df, str(out))
+
+    assert out.read_text(encoding="utf-8").splitlines() == ["Antigen,Antigen", "TP53,TP53", "TP53BP1,TP53BP1"]
+
+
+def test_ensure_metadata_file_extracts_only_the_table(monkeypatch, tmp_path):
+    """A download extracts just the metadata table and leaves no temporary files behind."""
+    table = b"Antigen\tCell type\nTP53\tBlood\n"
+    response = _FakeZipResponse({
+        "README.txt": b"not a table",
+        "chip_atlas_experiment_list/chip_atlas_experiment_list.tsv": table,
     })
-    monkeypatch.setattr(
-        Chip_Atlasmcp,
-        "load_metadata",
-        lambda x, **kwargs: dummy_df
+    monkeypatch.setattr(Chip_Atlasmcp.requests, "get", lambda url, **kwargs: response)
+    monkeypatch.setattr(Chip_Atlasmcp, "_BASE", tmp_path)
+    (tmp_path / "chip_atlas_experiment_list.zip.part").write_bytes(b"left by an interrupted run")
+
+    fpath = _REAL_ENSURE_METADATA_FILE("experiment_list", silent=True)
+
+    assert fpath == str(tmp_path / "chip_atlas_experiment_list.tsv")
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["chip_atlas_experiment_list.tsv"]
+    assert (tmp_path / "chip_atlas_experiment_list.tsv").read_bytes() == table
+
+
+def test_prefetch_all_returns_one_result_per_table(monkeypatch):
+    """prefetch_all ensures every metadata table and maps each type to its result."""
+    monkeypatch.setattr(Chip_Atlasmcp, "ensure_metadata_file", lambda metadata_type, silent=False: metadata_type + ".tsv")
+
+    assert Chip_Atlasmcp.prefetch_all() == {k: k + ".tsv" for k in Chip_Atlasmcp.METADATA_SPECS}
+
+def test_load_metadata_uses_parquet_cache(metadata_tsv):
+    """The first load writes a Parquet cache that later loads read from."""
+    pytest.importorskip("pyarrow")
+    df_first = _REAL_LOAD_METADATA("experiment_list", silent=True)
+    assert metadata_tsv.with_suffix(".parquet").exists()
+
+    df_cached = _REAL_LOAD_METADATA("experiment_list", silent=True, columns=["Antigen"])
+    assert "Cell type" not in df_cached.columns
+    assert df_cached["Antigen"].tolist() == df_first["Antigen"].tolist()
+
+
+def test_load_metadata_rebuilds_corrupt_parquet_cache(metadata_tsv):
+    """A corrupt Parquet cache is discarded and rebuilt from the source file."""
+    pytest.importorskip("pyarrow")
+    parquet_path = metadata_tsv.with_suffix(".parquet")
+    parquet_path.write_bytes(b"PAR1garbage")
+
+    df = _REAL_LOAD_METADATA("experiment_list", silent=True)
+    assert df is not None
+    assert df["Antigen"].tolist() == ["TP53", "BRCA1"]
+    assert pd.read_parquet(parquet_path)["Antigen"].tolist() == ["TP53", "BRCA1"]
+    assert not list(metadata_tsv.parent.glob("*.part"))
+
+
+def test_load_metadata_unknown_column_keeps_parquet_cache(monkeypatch, metadata_tsv):
+    """Asking for a column the cached table lacks fails fast and leaves the cache alone."""
+    pytest.importorskip("pyarrow")
+    _REAL_LOAD_METADATA("experiment_list", silent=True)
+    parquet_path = metadata_tsv.with_suffix(".parquet")
+    cache_mtime = parquet_path.stat().st_mtime_ns
+    parsed = []
+    monkeypatch.setattr(Chip_Atlasmcp, "_read_table", lambda *args, **kwargs: parsed.append(args))
+
+    assert _REAL_LOAD_METADATA("experiment_list", silent=True, columns=["Antigen", "Nope"]) is None
+    assert not parsed
+    assert parquet_path.stat().st_mtime_ns == cache_mtime
+
+def test_read_table_invalid_utf8_parses_once_more(monkeypatch, metadata_tsv):
+    """A file Arrow rejects as invalid UTF-8 is re-read once by the C engine, with replacement."""
+    pytest.importorskip("pyarrow")
+    metadata_tsv.write_bytes(b"Antigen\tCell type\nTP53\tBl\xffood\n")
+    read_csv_calls = []
+    real_read_csv = pd.read_csv
+
+    def counting_read_csv(*args, **kwargs):
+        read_csv_calls.append(kwargs)
+        return real_read_csv(*args, **kwargs)
+
+    monkeypatch.setattr(pd, "read_csv", counting_read_csv)
+
+    df = Chip_Atlasmcp._read_table(str(metadata_tsv), "\t", ["Antigen", "Cell type"])
+    assert df["Cell type"].tolist() == ["Bl\ufffdood"]
+    assert [kw["encoding_errors"] for kw in read_csv_calls] == ["replace"]
+
+
+def test_search_index_matches_scan(monkeypatch, metadata_tsv):
+    """Cached queries via the search index return the same rows, in order, as a full scan."""
+    metadata_tsv.write_text(
+        "Antigen\tCell type\n"
+        "TP53\tBlood\n"
+        "BRCA1\tBreast\n"
+        "\tLiver\n"
+        "TP53\tBone\n"
+        "TP53BP1\tBrain\n",
+        encoding="utf-8",
     )
+    monkeypatch.setattr(Chip_Atlasmcp, "load_metadata", _REAL_LOAD_METADATA)
+    Chip_Atlasmcp.clear_metadata_cache()
+
+    scanned = Chip_Atlasmcp.fetch_and_display("experiment_list", "TP53", silent=True, save=False)
+    monkeypatch.setenv("CHIPATLAS_CACHE", "1")
+    indexed = Chip_Atlasmcp.fetch_and_display("experiment_list", "TP53", silent=True, save=False)
+
+    assert ("experiment_list", None) in Chip_Atlasmcp._SEARCH_INDEXES
+    assert indexed["Cell type"].tolist() == ["Blood", "Bone", "Brain"]
+    pd.testing.assert_frame_equal(indexed, scanned)
+
+    index = Chip_Atlasmcp._SEARCH_INDEXES[("experiment_list", None)]
+    assert Chip_Atlasmcp._index_lookup(index, "tp53").tolist() == [0, 3, 4]
+    assert Chip_Atlasmcp._index_lookup(index, "brca").tolist() == [1]
+    assert Chip_Atlasmcp._index_lookup(index, "xyzgene").tolist() == []
+    assert Chip_Atlasmcp.fetch_and_display("experiment_list", "XYZGENE", silent=True, save=False) is None
+    Chip_Atlasmcp.clear_metadata_cache()
+
+
+def test_fetch_chip_atlas_multi_fetches_each_type_once(monkeypatch, setup_tmp_results):
+    """Repeated metadata types are fetched once and each reported once."""
+    mcp_server = pytest.importorskip("Chip_Atlasmcp.mcp_server")
+    fetched = []
+    real_fetch = Chip_Atlasmcp.fetch_and_display
+
+    def recording_fetch(metadata_type, *args, **kwargs):
+        fetched.append(metadata_type)
+        return real_fetch(metadata_type, *args, **kwargs)
+
+    monkeypatch.setattr(Chip_Atlasmcp, "fetch_and_display", recording_fetch)
+    response = asyncio.run(mcp_server.fetch_chip_atlas_multi("TP53", ["experiment_list", "analysis_list", "experiment_list"]))
+
+    assert sorted(fetched) == ["analysis_list", "experiment_list"]
+    assert list(response["results"]) == ["experiment_list", "analysis_list"]
+    assert response["results"]["experiment_list"]["status"] == "success"
+    assert response["results"]["experiment_list"]["rows_found"] == 2
 
-    df = Chip_Atlasmcp.fetch_and_display("analysis_list", "XYZGENE")
-    assert df is None or df.empty, "Expected no results for unmatched keyword"
+def test_load_metadata_keeps_tables_in_memory(monkeypatch, mock_experiment_df):
+    """A second load is served from memory without reading the metadata file."""
+    monkeypatch.setattr(Chip_Atlasmcp, "_read_metadata", lambda x, **kwargs: mock_experiment_df.copy())
+    Chip_Atlasmcp.clear_metadata_cache()
 
+    df_first = _REAL_LOAD_METADATA("experiment_list", silent=True)
+    monkeypatch.setattr(Chip_Atlasmcp, "_read_metadata", _no_metadata)
+    df_second = _REAL_LOAD_METADATA("experiment_list", silent=True)
 
-def test_metadata_type_invalid():
-    """Ensure that an invalid metadata type returns None."""
-    result = Chip_Atlasmcp.ensure_metadata_file("invalid_type")
-    assert result is None
+    assert df_second is not None
+    assert df_second is not df_first
+    assert df_second["Antigen"].tolist() == list(_ANTIGENS)
+    Chip_Atlasmcp.clear_metadata_cache()